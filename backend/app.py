@@ -2,11 +2,16 @@ import os
 import uuid
 import logging
 import datetime as dt
+import http.client
+from concurrent.futures import ThreadPoolExecutor
 
 from flask import Flask, request, jsonify
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import BotoCoreError, ClientError
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.conditions import Key
+import urllib3.connection
 
 # ----------------------------------------------------------------------
 # Basic Flask + logging setup
@@ -33,14 +38,155 @@ if not SCAN_TABLE:
         "SCAN_TABLE env var is not set – scan-status will fail until this is configured."
     )
 
-s3 = boto3.client("s3")
-dynamodb = boto3.resource("dynamodb")
+# ----------------------------------------------------------------------
+# HTTP send buffer for S3 uploads
+# ----------------------------------------------------------------------
+
+# http.client / urllib3 push request bodies to the socket in 8-16 KB reads.
+# For multipart S3 uploads that means thousands of tiny send() calls per part;
+# a 1 MB block keeps upload threads off the GIL. Set S3_HTTP_BUFFER=0 to keep
+# the library defaults.
+S3_HTTP_BUFFER = int(os.environ.get("S3_HTTP_BUFFER", str(1024 * 1024)))
+
+
+def _raise_http_blocksize(blocksize: int):
+    """
+    Raise the default `blocksize` of every HTTP connection class boto uses.
+    Must run before the boto3 clients below open their first connection.
+    """
+    # Plain http.client (and urllib3 1.x, which inherits its signature)
+    defaults = http.client.HTTPConnection.__init__.__defaults__
+    http.client.HTTPConnection.__init__.__defaults__ = tuple(
+        blocksize if d == 8192 else d for d in defaults
+    )
+
+    # urllib3 2.x declares blocksize as a keyword-only argument
+    for conn_cls in (urllib3.connection.HTTPConnection, urllib3.connection.HTTPSConnection):
+        kwdefaults = conn_cls.__init__.__kwdefaults__ or {}
+        if "blocksize" in kwdefaults:
+            kwdefaults["blocksize"] = blocksize
+
+
+if S3_HTTP_BUFFER > 0:
+    _raise_http_blocksize(S3_HTTP_BUFFER)
+
+# ----------------------------------------------------------------------
+# AWS clients
+# ----------------------------------------------------------------------
+
+# One session + one pooled config shared by every request thread. Clients are
+# created at import time (gunicorn runs with --preload) so TCP/TLS connections
+# to S3 and DynamoDB are reused instead of being re-established per request.
+_session = boto3.session.Session()
+_boto_config = Config(
+    max_pool_connections=max(32, (os.cpu_count() or 4) * 8),
+    retries={"mode": "adaptive", "max_attempts": 5},
+    tcp_keepalive=True,
+)
+
+# Virtual-hosted addressing makes presigned URLs point at the regional S3
+# endpoint, so browser PUTs are not redirected (which would break CORS).
+s3 = _session.client(
+    "s3", config=_boto_config.merge(Config(s3={"addressing_style": "virtual"}))
+)
+dynamodb = _session.resource("dynamodb", config=_boto_config)
+scan_table = dynamodb.Table(SCAN_TABLE) if SCAN_TABLE else None
+
+# Small files go up in a single PUT; larger ones stream as 16 MB parts in
+# parallel without buffering the whole upload in worker memory.
+UPLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True,
+)
+
+# Background threads for DynamoDB writes that can overlap the S3 upload.
+# Threads start lazily on first submit, i.e. in the forked gunicorn worker.
+record_write_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="record-write")
 
 
 def get_scan_table():
-    if not SCAN_TABLE:
+    if scan_table is None:
         raise RuntimeError("SCAN_TABLE env var not set in backend container.")
-    return dynamodb.Table(SCAN_TABLE)
+    return scan_table
+
+
+def utc_now_iso() -> str:
+    return dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds").replace(
+        "+00:00", "Z"
+    )
+
+
+def build_upload_key(file_id: str, scan_timestamp: str, original_name: str) -> str:
+    """
+    S3 key for an upload: uploads/{file_id}/{scan_timestamp}/{original_name}.
+    Carrying the record's sort key in the object key lets the Lambda update
+    the scan record directly instead of querying for it first.
+    """
+    return f"uploads/{file_id}/{scan_timestamp}/{original_name}"
+
+
+def put_pending_record(
+    file_id: str,
+    original_name: str,
+    s3_key: str,
+    scan_timestamp: str,
+    event_message: str,
+):
+    """
+    Write the initial PENDING scan record for an upload.
+    The Lambda scanner later updates this row once the object lands in S3.
+    The write races the upload, so if the scanner got there first (and
+    created the row itself) its CLEAN result is kept.
+    """
+    table = get_scan_table()
+
+    try:
+        table.put_item(
+            Item={
+                # ✅ KEY attributes in your table:
+                "file_id": file_id,
+                "scan_timestamp": scan_timestamp,
+
+                "file_name": original_name,
+                "s3_bucket": UPLOAD_BUCKET,
+                "s3_key": s3_key,
+                "scan_status": "PENDING",
+                "scan_detail": "Waiting for Lambda scanner to run.",
+                "scan_events": [
+                    {
+                        "timestamp": scan_timestamp,
+                        "message": event_message,
+                    }
+                ],
+                "created_at": scan_timestamp,
+                "updated_at": scan_timestamp,
+            },
+            ConditionExpression="attribute_not_exists(file_id)",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        logger.info("Scan record already processed; keeping it. file_id=%s", file_id)
+
+
+def discard_pending_record(record_future, file_id: str, scan_timestamp: str):
+    """
+    Compensating action for /api/upload: if the S3 upload failed but the
+    concurrent PENDING write succeeded, delete that orphaned record.
+    """
+    try:
+        record_future.result()
+    except (BotoCoreError, ClientError, RuntimeError):
+        return  # record was never written
+
+    try:
+        get_scan_table().delete_item(
+            Key={"file_id": file_id, "scan_timestamp": scan_timestamp}
+        )
+    except (BotoCoreError, ClientError):
+        logger.exception("Failed to delete orphaned scan record. file_id=%s", file_id)
 
 
 # ----------------------------------------------------------------------
@@ -52,6 +198,25 @@ def error_response(message: str, status_code: int = 500):
     return jsonify({"error": message}), status_code
 
 
+# ----------------------------------------------------------------------
+# Helper: polling backoff hint for /api/scan-status
+# ----------------------------------------------------------------------
+
+POLL_LINEAR_STEPS = 5       # 1s, 2s, ... 5s
+POLL_MAX_WAIT_SECONDS = 30
+
+
+def poll_backoff_seconds(retries: int) -> int:
+    """
+    Linear-then-exponential wait before the next status poll.
+    Short scans get answered quickly; long scans stop generating GET storms.
+    """
+    if retries < POLL_LINEAR_STEPS:
+        return retries + 1
+    exponent = min(retries - POLL_LINEAR_STEPS + 1, 8)
+    return min(POLL_MAX_WAIT_SECONDS, POLL_LINEAR_STEPS * (2 ** exponent))
+
+
 # ----------------------------------------------------------------------
 # Health check endpoints
 # ----------------------------------------------------------------------
@@ -82,6 +247,7 @@ def alb_health():
 
 # ----------------------------------------------------------------------
 # Route: /api/upload – receives file, stores to S3, creates PENDING record
+# (legacy path – the frontend now uploads through /api/upload-url)
 # ----------------------------------------------------------------------
 
 @app.route("/api/upload", methods=["POST"])
@@ -103,10 +269,22 @@ def upload_file():
 
         original_name = file_storage.filename
         file_id = str(uuid.uuid4())
-        s3_key = f"uploads/{file_id}/{original_name}"
+        scan_timestamp = utc_now_iso()  # sort key for DynamoDB
+        s3_key = build_upload_key(file_id, scan_timestamp, original_name)
 
         logger.info("Uploading file to S3: bucket=%s key=%s", UPLOAD_BUCKET, s3_key)
 
+        # The PENDING record does not depend on the S3 response, so write it
+        # in the background while the upload streams.
+        record_future = record_write_pool.submit(
+            put_pending_record,
+            file_id,
+            original_name,
+            s3_key,
+            scan_timestamp,
+            "File uploaded to S3 and scan record created.",
+        )
+
         # Upload file to S3
         try:
             s3.upload_fileobj(
@@ -114,38 +292,16 @@ def upload_file():
                 Bucket=UPLOAD_BUCKET,
                 Key=s3_key,
                 ExtraArgs={"ServerSideEncryption": "AES256"},
+                Config=UPLOAD_TRANSFER_CONFIG,
             )
-        except (BotoCoreError, ClientError) as e:
+        except Exception as e:  # includes client disconnects while streaming
             logger.exception("Failed to upload file to S3.")
+            discard_pending_record(record_future, file_id, scan_timestamp)
             return error_response(f"Failed to upload file to S3: {e}", 500)
 
-        # Create PENDING scan record in DynamoDB
+        # Wait for the PENDING scan record in DynamoDB
         try:
-            table = get_scan_table()
-            now_iso = dt.datetime.utcnow().isoformat(timespec="seconds") + "Z"
-            scan_timestamp = now_iso  # sort key for DynamoDB
-
-            table.put_item(
-                Item={
-                    # ✅ KEY attributes in your table:
-                    "file_id": file_id,
-                    "scan_timestamp": scan_timestamp,
-
-                    "file_name": original_name,
-                    "s3_bucket": UPLOAD_BUCKET,
-                    "s3_key": s3_key,
-                    "scan_status": "PENDING",
-                    "scan_detail": "Waiting for Lambda scanner to run.",
-                    "scan_events": [
-                        {
-                            "timestamp": now_iso,
-                            "message": "File uploaded to S3 and scan record created.",
-                        }
-                    ],
-                    "created_at": now_iso,
-                    "updated_at": now_iso,
-                }
-            )
+            record_future.result()
         except (BotoCoreError, ClientError, RuntimeError) as e:
             logger.exception("Failed to write scan record to DynamoDB.")
             return error_response(f"Failed to write scan record to DynamoDB: {e}", 500)
@@ -166,6 +322,81 @@ def upload_file():
         return error_response(f"Unhandled exception in /api/upload: {e}", 500)
 
 
+# ----------------------------------------------------------------------
+# Route: /api/upload-url – creates PENDING record, returns presigned PUT URL
+# ----------------------------------------------------------------------
+
+PRESIGNED_URL_EXPIRES_SECONDS = 900
+
+
+@app.route("/api/upload-url", methods=["POST"])
+def create_upload_url():
+    """
+    Browser asks for a presigned URL and PUTs the file straight to S3,
+    so file bytes never pass through the backend task. The S3
+    ObjectCreated trigger starts the Lambda scan exactly as before.
+    """
+    try:
+        if not UPLOAD_BUCKET:
+            return error_response(
+                "UPLOAD_BUCKET env var is not configured on backend service.", 500
+            )
+
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return error_response("Expected a JSON object body with 'filename'.", 400)
+
+        original_name = body.get("filename")
+        if not isinstance(original_name, str) or not original_name:
+            return error_response(
+                "Missing 'filename' in JSON body – please select a file.", 400
+            )
+
+        file_id = str(uuid.uuid4())
+        scan_timestamp = utc_now_iso()  # sort key for DynamoDB
+        s3_key = build_upload_key(file_id, scan_timestamp, original_name)
+
+        try:
+            put_pending_record(
+                file_id,
+                original_name,
+                s3_key,
+                scan_timestamp,
+                "Upload URL issued and scan record created.",
+            )
+        except (BotoCoreError, ClientError, RuntimeError) as e:
+            logger.exception("Failed to write scan record to DynamoDB.")
+            return error_response(f"Failed to write scan record to DynamoDB: {e}", 500)
+
+        try:
+            upload_url = s3.generate_presigned_url(
+                "put_object",
+                Params={"Bucket": UPLOAD_BUCKET, "Key": s3_key},
+                ExpiresIn=PRESIGNED_URL_EXPIRES_SECONDS,
+                HttpMethod="PUT",
+            )
+        except (BotoCoreError, ClientError) as e:
+            logger.exception("Failed to generate presigned upload URL.")
+            return error_response(f"Failed to generate presigned upload URL: {e}", 500)
+
+        logger.info("Presigned upload URL issued. file_id=%s key=%s", file_id, s3_key)
+
+        return jsonify(
+            {
+                "file_id": file_id,
+                "file_name": original_name,
+                "upload_url": upload_url,
+                "expires_in": PRESIGNED_URL_EXPIRES_SECONDS,
+                "status": "PENDING",
+                "detail": "Upload URL issued. Waiting for file to arrive in S3.",
+            }
+        ), 200
+
+    except Exception as e:
+        logger.exception("Unhandled exception in /api/upload-url")
+        return error_response(f"Unhandled exception in /api/upload-url: {e}", 500)
+
+
 # ----------------------------------------------------------------------
 # Route: /api/scan-status – returns scan status + events from DynamoDB
 # ----------------------------------------------------------------------
@@ -177,6 +408,11 @@ def scan_status():
         if not file_id:
             return error_response("Missing required query parameter 'file_id'.", 400)
 
+        try:
+            retries = max(0, int(request.args.get("retries", 0)))
+        except ValueError:
+            retries = 0
+
         if not SCAN_TABLE:
             return error_response(
                 "SCAN_TABLE env var is not configured on backend service.", 500
@@ -187,44 +423,36 @@ def scan_status():
         try:
             table = get_scan_table()
 
-            # ---- Fast path: Query on partition key (if schema matches) ----
-            items = []
-            try:
-                resp = table.query(
-                    KeyConditionExpression=Key("file_id").eq(file_id),
-                    ScanIndexForward=False,  # newest first if sort key exists
-                    Limit=1,
-                    ConsistentRead=True,
-                )
-                items = resp.get("Items", [])
-                logger.info(
-                    "Query result for file_id=%s: %d item(s)", file_id, len(items)
-                )
-            except Exception as qe:
-                logger.warning(
-                    "Query on file_id=%s failed, will fall back to Scan. Error: %s",
-                    file_id,
-                    qe,
-                )
-                items = []
-
-            # ---- Fallback: Scan + filter by file_id ----
-            if not items:
-                resp = table.scan(
-                    FilterExpression=Attr("file_id").eq(file_id),
-                    ConsistentRead=True,
-                )
-                items = resp.get("Items", [])
-                logger.info(
-                    "Scan result for file_id=%s: %d item(s)", file_id, len(items)
-                )
+            # Query on the partition key only. The frontend polls this route,
+            # so a miss must never turn into a table-wide Scan. Eventually
+            # consistent reads are fine here: the next poll catches up.
+            resp = table.query(
+                KeyConditionExpression=Key("file_id").eq(file_id),
+                ScanIndexForward=False,  # newest first (sort key: scan_timestamp)
+                Limit=1,
+            )
+            items = resp.get("Items", [])
+            logger.info(
+                "Query result for file_id=%s: %d item(s)", file_id, len(items)
+            )
 
         except (BotoCoreError, ClientError, RuntimeError) as e:
             logger.exception("Failed to read scan record from DynamoDB.")
             return error_response(f"Failed to read scan record from DynamoDB: {e}", 500)
 
         if not items:
-            return error_response(f"No record found for file_id={file_id}", 404)
+            # Record not visible yet – report PENDING so the client keeps polling.
+            response = jsonify(
+                {
+                    "file_id": file_id,
+                    "file_name": "",
+                    "status": "PENDING",
+                    "detail": "No scan record yet.",
+                    "events": [],
+                }
+            )
+            response.headers["Retry-After"] = str(poll_backoff_seconds(retries))
+            return response, 200
 
         item = items[0]
 
@@ -262,7 +490,7 @@ def scan_status():
                     }
                 )
 
-        return jsonify(
+        response = jsonify(
             {
                 "file_id": item.get("file_id", file_id),
                 "file_name": item.get("file_name", ""),
@@ -270,7 +498,10 @@ def scan_status():
                 "detail": detail,
                 "events": normalized_events,
             }
-        ), 200
+        )
+        if status in ("PENDING", "RUNNING"):
+            response.headers["Retry-After"] = str(poll_backoff_seconds(retries))
+        return response, 200
 
     except Exception as e:
         logger.exception("Unhandled exception in /api/scan-status")
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+from botocore.stub import Stubber
+
+# app.py reads its config and builds its AWS clients at import time
+os.environ.setdefault("AWS_DEFAULT_REGION", "ca-central-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ["UPLOAD_BUCKET"] = "uploads-bucket"
+os.environ["SCAN_TABLE"] = "scan-table"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def ddb():
+    with Stubber(backend.dynamodb.meta.client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def s3():
+    with Stubber(backend.s3) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
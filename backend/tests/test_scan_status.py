@@ -0,0 +1,52 @@
+import pytest
+
+import app as backend
+
+
+@pytest.mark.parametrize(
+    "retries, expected",
+    [(0, 1), (1, 2), (4, 5), (5, 10), (6, 20), (7, 30), (50, 30)],
+)
+def test_poll_backoff_is_linear_then_exponential_and_capped(retries, expected):
+    assert backend.poll_backoff_seconds(retries) == expected
+
+
+def test_missing_record_reports_pending_with_retry_after(client, ddb):
+    ddb.add_response("query", {"Items": []})
+
+    resp = client.get("/api/scan-status?file_id=abc&retries=6")
+
+    assert resp.status_code == 200
+    assert resp.headers["Retry-After"] == "20"
+    data = resp.get_json()
+    assert data["status"] == "PENDING"
+    assert data["detail"] == "No scan record yet."
+
+
+def test_bad_retries_param_falls_back_to_first_step(client, ddb):
+    ddb.add_response("query", {"Items": []})
+
+    resp = client.get("/api/scan-status?file_id=abc&retries=oops")
+
+    assert resp.headers["Retry-After"] == "1"
+
+
+def test_terminal_status_has_no_retry_after(client, ddb):
+    ddb.add_response(
+        "query",
+        {
+            "Items": [
+                {
+                    "file_id": {"S": "abc"},
+                    "file_name": {"S": "report.pdf"},
+                    "scan_status": {"S": "CLEAN"},
+                }
+            ]
+        },
+    )
+
+    resp = client.get("/api/scan-status?file_id=abc&retries=3")
+
+    assert resp.status_code == 200
+    assert resp.get_json()["status"] == "CLEAN"
+    assert "Retry-After" not in resp.headers
@@ -0,0 +1,67 @@
+import io
+
+from botocore.stub import ANY
+
+import app as backend
+
+
+def upload(client):
+    return client.post(
+        "/api/upload",
+        data={"file": (io.BytesIO(b"hello"), "hello.txt")},
+        content_type="multipart/form-data",
+    )
+
+
+def test_upload_writes_pending_record_and_object(client, ddb, s3):
+    ddb.add_response("put_item", {})
+    s3.add_response("put_object", {"ETag": '"etag"'})
+
+    resp = upload(client)
+
+    assert resp.status_code == 200
+    assert resp.get_json()["status"] == "PENDING"
+
+
+def test_failed_s3_upload_deletes_pending_record(client, ddb, s3):
+    ddb.add_response("put_item", {})
+    ddb.add_response(
+        "delete_item",
+        {},
+        {
+            "TableName": "scan-table",
+            "Key": {"file_id": ANY, "scan_timestamp": ANY},
+        },
+    )
+    s3.add_client_error("put_object", "AccessDenied")
+
+    resp = upload(client)
+
+    assert resp.status_code == 500
+
+
+def test_non_aws_upload_failure_also_deletes_pending_record(client, ddb, monkeypatch):
+    def broken_upload(**kwargs):
+        raise OSError("client disconnected")
+
+    monkeypatch.setattr(backend.s3, "upload_fileobj", broken_upload)
+    ddb.add_response("put_item", {})
+    ddb.add_response("delete_item", {})
+
+    resp = upload(client)
+
+    assert resp.status_code == 500
+    assert "client disconnected" in resp.get_json()["error"]
+
+
+def test_pending_write_keeps_an_already_processed_record(ddb):
+    ddb.add_client_error("put_item", "ConditionalCheckFailedException")
+
+    # Must not raise: the scanner created the row first and it is kept
+    backend.put_pending_record(
+        "abc",
+        "hello.txt",
+        "uploads/abc/2026-10-15T11:37:18Z/hello.txt",
+        "2026-10-15T11:37:18Z",
+        "Upload URL issued and scan record created.",
+    )
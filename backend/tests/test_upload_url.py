@@ -0,0 +1,49 @@
+from urllib.parse import unquote, urlsplit
+
+import pytest
+from botocore.stub import ANY
+
+
+def test_upload_url_creates_pending_record_and_presigns_put(client, ddb):
+    ddb.add_response(
+        "put_item",
+        {},
+        {
+            "TableName": "scan-table",
+            "Item": ANY,
+            "ConditionExpression": "attribute_not_exists(file_id)",
+        },
+    )
+
+    resp = client.post("/api/upload-url", json={"filename": "report.pdf"})
+
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["file_name"] == "report.pdf"
+    assert data["status"] == "PENDING"
+    assert data["expires_in"] == 900
+
+    url = urlsplit(data["upload_url"])
+    assert url.netloc == "uploads-bucket.s3.ca-central-1.amazonaws.com"
+    # uploads/{file_id}/{scan_timestamp}/{original_name}
+    parts = unquote(url.path).lstrip("/").split("/")
+    assert parts[0] == "uploads"
+    assert parts[1] == data["file_id"]
+    assert parts[3] == "report.pdf"
+
+
+def test_upload_url_requires_filename(client, ddb):
+    resp = client.post("/api/upload-url", json={})
+
+    assert resp.status_code == 400
+    assert "filename" in resp.get_json()["error"]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [["report.pdf"], "report.pdf", 42, {"filename": 123}, {"filename": ""}],
+)
+def test_upload_url_rejects_malformed_body(client, ddb, body):
+    resp = client.post("/api/upload-url", json=body)
+
+    assert resp.status_code == 400
@@ -1,13 +1,15 @@
 // frontend/app.js
 
 // IMPORTANT: align these with your Flask backend routes.
-const API_UPLOAD_URL = "api/upload";       // behind ALB, no leading slash
-const API_STATUS_URL = "api/scan-status";  // GET ?file_id=...
+const API_UPLOAD_URL_ENDPOINT = "api/upload-url"; // POST {filename} -> presigned PUT
+const API_STATUS_URL = "api/scan-status";     // GET ?file_id=...
 
+// Fallback delay when the backend does not send a Retry-After hint.
 const POLL_INTERVAL_MS = 3000;
 
 let currentFileId = null;
 let pollTimer = null;
+let pollRetries = 0;
 
 document.addEventListener("DOMContentLoaded", () => {
   const uploadForm = document.getElementById("uploadForm");
@@ -103,10 +105,23 @@ document.addEventListener("DOMContentLoaded", () => {
       : "Upload & Scan";
   }
 
+  function stopPolling() {
+    clearTimeout(pollTimer);
+    pollTimer = null;
+  }
+
+  function scheduleNextPoll(retryAfterHeader) {
+    const seconds = parseFloat(retryAfterHeader);
+    const delayMs =
+      Number.isFinite(seconds) && seconds >= 0
+        ? seconds * 1000
+        : POLL_INTERVAL_MS;
+    pollTimer = setTimeout(pollStatus, delayMs);
+  }
+
   function resetStatus() {
     currentFileId = null;
-    clearInterval(pollTimer);
-    pollTimer = null;
+    stopPolling();
 
     fileNameEl.textContent = "—";
     fileIdEl.textContent = "—";
@@ -158,22 +173,24 @@ document.addEventListener("DOMContentLoaded", () => {
 
     const file = fileInput.files[0];
     setLoading(true);
-    clearInterval(pollTimer);
-    pollTimer = null;
+    // Drop the previous file so an in-flight poll for it cannot reschedule
+    // itself or touch the UI while this upload runs.
+    currentFileId = null;
+    pollRetries = 0;
+    stopPolling();
     clearEvents();
 
     fileNameEl.textContent = file.name;
-    statusTextEl.textContent = "Uploading file to backend…";
+    statusTextEl.textContent = "Requesting upload URL…";
     detailTextEl.textContent = "—";
     setStatusPill("PENDING");
 
     try {
-      const formData = new FormData();
-      formData.append("file", file);
-
-      const resp = await fetch(API_UPLOAD_URL, {
+      // 1) Ask the backend for a presigned S3 URL (also creates the PENDING record)
+      const resp = await fetch(API_UPLOAD_URL_ENDPOINT, {
         method: "POST",
-        body: formData,
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ filename: file.name }),
       });
 
       const responseText = await resp.text(); // read once
@@ -197,8 +214,19 @@ document.addEventListener("DOMContentLoaded", () => {
       const data = JSON.parse(responseText || "{}");
       const fileId = data.file_id || data.id || null;
 
-      if (!fileId) {
-        throw new Error("Backend response missing file_id.");
+      if (!fileId || !data.upload_url) {
+        throw new Error("Backend response missing file_id or upload_url.");
+      }
+
+      // 2) PUT the file straight to S3 – it never passes through the backend
+      statusTextEl.textContent = "Uploading file to S3…";
+      const putResp = await fetch(data.upload_url, {
+        method: "PUT",
+        body: file,
+      });
+
+      if (!putResp.ok) {
+        throw new Error(`Upload to S3 failed with status ${putResp.status}.`);
       }
 
       currentFileId = fileId;
@@ -209,10 +237,10 @@ document.addEventListener("DOMContentLoaded", () => {
         message: "File uploaded successfully. Scan will start shortly.",
       });
 
-      // start polling
+      // start polling – first poll fires immediately, later ones follow
+      // the backend's Retry-After hint
       setStatusPill("PENDING");
-      pollTimer = setInterval(pollStatus, POLL_INTERVAL_MS);
-      // fire first poll immediately
+      pollRetries = 0;
       pollStatus();
     } catch (err) {
       console.error(err);
@@ -233,14 +261,24 @@ document.addEventListener("DOMContentLoaded", () => {
 
   async function pollStatus() {
     if (!currentFileId) return;
+    const polledFileId = currentFileId;
+    pollTimer = null;
+
+    let retryAfter = null;
+    let terminal = false;
 
     try {
       const url = `${API_STATUS_URL}?file_id=${encodeURIComponent(
-        currentFileId
-      )}`;
+        polledFileId
+      )}&retries=${pollRetries}`;
+      pollRetries += 1;
       const resp = await fetch(url);
+      retryAfter = resp.headers.get("Retry-After");
       const responseText = await resp.text();
 
+      // A new upload started while this request was in flight
+      if (currentFileId !== polledFileId) return;
+
       if (!resp.ok) {
         throw new Error(
           `Status check failed with ${resp.status}. Body: ${responseText}`
@@ -268,22 +306,27 @@ document.addEventListener("DOMContentLoaded", () => {
       }
 
       // Treat these as terminal states and stop polling
-      const terminal = ["CLEAN", "INFECTED", "FAILED", "ERROR"];
-      if (terminal.includes(status)) {
-        clearInterval(pollTimer);
-        pollTimer = null;
+      const terminalStatuses = ["CLEAN", "INFECTED", "FAILED", "ERROR"];
+      if (terminalStatuses.includes(status)) {
+        terminal = true;
         appendEvent({
           message: `Scan finished with status: ${status}.`,
         });
       }
     } catch (err) {
       console.error(err);
+      if (currentFileId !== polledFileId) return;
       appendEvent({
         message: `Error checking scan status: ${
           err.message || String(err)
         }`,
       });
     }
+
+    // Keep polling until a terminal status (or a new upload resets us)
+    if (!terminal && currentFileId === polledFileId && pollTimer === null) {
+      scheduleNextPoll(retryAfter);
+    }
   }
 
   // ---------------------------------------------------------------------------
@@ -93,7 +93,8 @@ data "aws_iam_policy_document" "ecs_task_role_policy" {
       "dynamodb:PutItem",
       "dynamodb:GetItem",
       "dynamodb:Query",
-      "dynamodb:UpdateItem"
+      "dynamodb:UpdateItem",
+      "dynamodb:DeleteItem"
     ]
 
     resources = [
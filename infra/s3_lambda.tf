@@ -45,6 +45,19 @@ resource "aws_s3_bucket_public_access_block" "uploads_pab" {
   restrict_public_buckets = true
 }
 
+# Browser uploads go straight to S3 via presigned PUT URLs (/api/upload-url)
+resource "aws_s3_bucket_cors_configuration" "uploads_cors" {
+  bucket = aws_s3_bucket.uploads.id
+
+  cors_rule {
+    allowed_methods = ["PUT"]
+    allowed_origins = ["http://${aws_lb.app.dns_name}"]
+    allowed_headers = ["*"]
+    expose_headers  = ["ETag"]
+    max_age_seconds = 3000
+  }
+}
+
 ############################
 # Lambda IAM role + policy
 ############################
@@ -101,6 +114,7 @@ data "aws_iam_policy_document" "scan_lambda_policy" {
       "dynamodb:GetItem",
       "dynamodb:Query",
       "dynamodb:Scan",
+      "dynamodb:DescribeTable",
     ]
 
     resources = [
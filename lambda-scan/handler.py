@@ -1,10 +1,15 @@
 import os
+import re
 import json
+import time
 import logging
-import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
 
 import boto3
-from boto3.dynamodb.conditions import Key
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from boto3.dynamodb.types import TypeSerializer
 
 # ----------------------------------------------------------------------
 # Logging setup
@@ -18,124 +23,263 @@ logger.setLevel(logging.INFO)
 # ----------------------------------------------------------------------
 
 SCAN_TABLE = os.environ.get("SCAN_TABLE")
+MAX_RECORD_WORKERS = 16  # upper bound on records processed concurrently
+LOOKUP_ATTEMPTS = 2  # eventually consistent record lookup: initial try + one retry
+LOOKUP_RETRY_SECONDS = 0.2
 
 if not SCAN_TABLE:
     logger.warning("SCAN_TABLE environment variable is not set. Lambda will fail.")
 
-dynamodb = boto3.resource("dynamodb")
-
-
-def get_scan_table():
+# Built once per container: warm invocations reuse the keep-alive connection
+# pool, which is sized for the concurrent record workers below.
+boto_config = Config(
+    max_pool_connections=32,
+    retries={"mode": "adaptive", "max_attempts": 3},
+    tcp_keepalive=True,
+    connect_timeout=1,
+    read_timeout=10,
+)
+
+# Low-level client with hand-built attribute values: skips the resource
+# layer's per-call marshalling and Decimal conversion on the hot path. One
+# explicit session so credential/signer setup is shared by every thread.
+session = boto3.session.Session()
+dynamodb = session.client("dynamodb", config=boto_config)
+type_serializer = TypeSerializer()
+
+# DynamoDB expressions for the CLEAN update, built once per container
+CLEAN_UPDATE_EXPRESSION = (
+    "SET scan_status = :s, "
+    "scan_detail = :d, "
+    "updated_at = :u, "
+    "scan_events = list_append(if_not_exists(scan_events, :empty), :ev)"
+)
+CLEAN_UPDATE_CONDITION = "attribute_exists(file_id) AND scan_status <> :s"
+CLEAN_UPDATE_STATIC_VALUES = {
+    ":s": {"S": "CLEAN"},
+    ":d": {"S": "Stub scanner: file marked CLEAN (no AV engine executed)."},
+    ":empty": {"L": []},
+}
+CLEAN_EVENT_MESSAGE = {"S": "Lambda stub scanner ran and marked file as CLEAN."}
+
+# Created once per container and reused by warm invocations, so batched
+# events do not pay thread start-up on every call.
+record_pool = ThreadPoolExecutor(max_workers=MAX_RECORD_WORKERS, thread_name_prefix="record")
+
+
+def get_scan_table_name():
     if not SCAN_TABLE:
         raise RuntimeError("SCAN_TABLE environment variable is not set.")
-    return dynamodb.Table(SCAN_TABLE)
+    return SCAN_TABLE
+
+
+# Open the DynamoDB TLS connection during the init phase (which also runs
+# ahead of traffic under provisioned concurrency) so the first invocation
+# does not pay the handshake. Set PREWARM_CONNECTIONS=0 to disable.
+PREWARM_CONNECTIONS = os.environ.get("PREWARM_CONNECTIONS", "1") == "1"
+
+if PREWARM_CONNECTIONS and SCAN_TABLE:
+    try:
+        dynamodb.describe_table(TableName=SCAN_TABLE)
+    except Exception:
+        logger.warning("DynamoDB connection pre-warm failed; continuing.", exc_info=True)
 
 
 # ----------------------------------------------------------------------
 # Helper functions
 # ----------------------------------------------------------------------
 
-def extract_file_id_from_key(s3_key: str) -> str | None:
+UPLOAD_KEY_RE = re.compile(
+    r"^uploads/(?P<file_id>[^/]+)/"
+    r"(?:(?P<scan_timestamp>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z)/)?"
+    r"(?P<file_name>.+)$"
+)
+
+
+def extract_ids_from_key(s3_key: str) -> tuple[str, str | None] | None:
     """
     Your backend uploads to keys like:
+        uploads/{file_id}/{scan_timestamp}/{original_name}
+    Older uploads have no scan_timestamp segment:
         uploads/{file_id}/{original_name}
-    So we take the second path component as file_id.
+    Returns (file_id, scan_timestamp or None), or None if the key is unexpected.
     """
-    parts = s3_key.split("/")
-    if len(parts) < 3:
+    match = UPLOAD_KEY_RE.match(s3_key)
+    if not match:
         logger.warning("Unexpected S3 key format: %s", s3_key)
         return None
-    return parts[1]
+    return match.group("file_id"), match.group("scan_timestamp")
 
 
-def update_scan_record_to_clean(table, file_id: str):
+def find_latest_scan_timestamp(table_name: str, file_id: str) -> str | None:
     """
-    Find the latest record for this file_id and mark it as CLEAN.
-    If no record exists (edge case), this function will create one.
+    Legacy keys do not carry the sort key, so look up the newest record.
+    Eventually consistent (half the RCUs); the upload wrote this record well
+    before S3 fired the event, so one short retry covers the rare lag.
     """
-    now = dt.datetime.utcnow()
-    now_iso = now.replace(microsecond=0).isoformat() + "Z"
+    for attempt in range(LOOKUP_ATTEMPTS):
+        if attempt:
+            time.sleep(LOOKUP_RETRY_SECONDS)
+        try:
+            resp = dynamodb.query(
+                TableName=table_name,
+                KeyConditionExpression="file_id = :f",
+                ExpressionAttributeValues={":f": {"S": file_id}},
+                ProjectionExpression="scan_timestamp",
+                ScanIndexForward=False,  # newest first
+                Limit=1,
+            )
+        except (BotoCoreError, ClientError) as e:
+            logger.error("Failed to query DynamoDB for file_id=%s: %s", file_id, e)
+            raise
+
+        items = resp.get("Items", [])
+        if items:
+            return items[0]["scan_timestamp"]["S"]
+
+    return None
 
-    # Try to get the latest record for this file_id
+
+def mark_record_clean(table_name: str, file_id: str, scan_timestamp: str, now_iso: str) -> bool:
+    """
+    Single conditional UpdateItem on the known primary key.
+    Returns False if the record does not exist, True otherwise.
+    """
+    # Append server-side with list_append so we never ship the whole
+    # event history back to DynamoDB on every scan.
     try:
-        resp = table.query(
-            KeyConditionExpression=Key("file_id").eq(file_id),
-            ScanIndexForward=False,  # newest first
-            Limit=1,
-            ConsistentRead=True,
+        dynamodb.update_item(
+            TableName=table_name,
+            Key={
+                "file_id": {"S": file_id},
+                "scan_timestamp": {"S": scan_timestamp},
+            },
+            UpdateExpression=CLEAN_UPDATE_EXPRESSION,
+            # Never upsert a partial row, and skip duplicate S3 events for a
+            # record that is already CLEAN.
+            ConditionExpression=CLEAN_UPDATE_CONDITION,
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            ExpressionAttributeValues={
+                **CLEAN_UPDATE_STATIC_VALUES,
+                ":u": {"S": now_iso},
+                ":ev": {
+                    "L": [
+                        {
+                            "M": {
+                                "timestamp": {"S": now_iso},
+                                "message": CLEAN_EVENT_MESSAGE,
+                            }
+                        }
+                    ]
+                },
+            },
+        )
+        logger.info("Updated scan record for file_id=%s to CLEAN", file_id)
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            logger.error(
+                "Failed to update scan record in DynamoDB for file_id=%s: %s", file_id, e
+            )
+            raise
+        if e.response.get("Item"):
+            logger.info("Scan record for file_id=%s is already CLEAN; skipping.", file_id)
+            return True
+        return False
+    except BotoCoreError as e:
+        logger.error(
+            "Failed to update scan record in DynamoDB for file_id=%s: %s", file_id, e
         )
-        items = resp.get("Items", [])
-    except Exception as e:
-        logger.exception("Failed to query DynamoDB for file_id=%s", file_id)
         raise
 
-    if items:
-        item = items[0]
-        logger.info("Found existing scan record for file_id=%s", file_id)
 
-        existing_events = item.get("scan_events", [])
-        if not isinstance(existing_events, list):
-            existing_events = []
+def update_scan_record_to_clean(
+    table_name: str, file_id: str, scan_timestamp: str | None, now_iso: str
+):
+    """
+    Mark the scan record for this upload as CLEAN.
+    If no record exists (edge case), this function will create one.
+    """
+    if scan_timestamp is None:
+        scan_timestamp = find_latest_scan_timestamp(table_name, file_id)
 
-        existing_events.append(
+    if scan_timestamp is not None:
+        if mark_record_clean(table_name, file_id, scan_timestamp, now_iso):
+            return
+    else:
+        scan_timestamp = now_iso
+
+    # Edge case: no record exists (yet), create one so /api/scan-status still works.
+    # Use the upload's own sort key when the S3 key carries it: the backend's
+    # late PENDING write is conditional on the row not existing, so it then
+    # cannot overwrite this CLEAN result.
+    logger.warning(
+        "No existing scan record for file_id=%s, creating a new CLEAN record.", file_id
+    )
+
+    item = {
+        "file_id": file_id,
+        "scan_timestamp": scan_timestamp,
+        "file_name": file_id,
+        "s3_bucket": "unknown",
+        "s3_key": "unknown",
+        "scan_status": "CLEAN",
+        "scan_detail": "Stub scanner created CLEAN record (no AV engine).",
+        "scan_events": [
             {
                 "timestamp": now_iso,
-                "message": "Lambda stub scanner ran and marked file as CLEAN.",
+                "message": "Lambda stub scanner created this record.",
             }
-        )
+        ],
+    }
 
-        try:
-            table.update_item(
-                Key={
-                    "file_id": item["file_id"],
-                    "scan_timestamp": item["scan_timestamp"],
-                },
-                UpdateExpression=(
-                    "SET scan_status = :s, "
-                    "scan_detail = :d, "
-                    "scan_events = :e"
-                ),
-                ExpressionAttributeValues={
-                    ":s": "CLEAN",
-                    ":d": "Stub scanner: file marked CLEAN (no AV engine executed).",
-                    ":e": existing_events,
-                },
-            )
-            logger.info("Updated scan record for file_id=%s to CLEAN", file_id)
-        except Exception as e:
-            logger.exception(
-                "Failed to update scan record in DynamoDB for file_id=%s", file_id
-            )
-            raise
-    else:
-        # Edge case: no record exists yet, create one so /api/scan-status still works.
-        logger.warning(
-            "No existing scan record for file_id=%s, creating a new CLEAN record.", file_id
+    try:
+        dynamodb.put_item(
+            TableName=table_name,
+            Item={k: type_serializer.serialize(v) for k, v in item.items()},
+        )
+    except (BotoCoreError, ClientError) as e:
+        logger.error(
+            "Failed to create new scan record in DynamoDB for file_id=%s: %s", file_id, e
         )
+        raise
 
-        try:
-            table.put_item(
-                Item={
-                    "file_id": file_id,
-                    "scan_timestamp": now_iso,
-                    "file_name": file_id,
-                    "s3_bucket": "unknown",
-                    "s3_key": "unknown",
-                    "scan_status": "CLEAN",
-                    "scan_detail": "Stub scanner created CLEAN record (no AV engine).",
-                    "scan_events": [
-                        {
-                            "timestamp": now_iso,
-                            "message": "Lambda stub scanner created this record.",
-                        }
-                    ],
-                }
-            )
-        except Exception as e:
-            logger.exception(
-                "Failed to create new scan record in DynamoDB for file_id=%s", file_id
+
+def process_record(table_name: str, record, now_iso: str) -> bool:
+    """
+    Handle one S3 event record. Returns True if the scan record was updated,
+    False if the record was skipped or failed (errors are logged, not raised).
+    """
+    try:
+        s3_info = record.get("s3", {})
+        bucket = s3_info.get("bucket", {}).get("name")
+        # Keys in S3 event notifications are URL-encoded (":" -> "%3A", " " -> "+")
+        key = unquote_plus(s3_info.get("object", {}).get("key") or "")
+
+        if not bucket or not key:
+            logger.warning("Missing bucket/key in S3 event record: %s", record)
+            return False
+
+        logger.info("Processing S3 object: bucket=%s key=%s", bucket, key)
+
+        ids = extract_ids_from_key(key)
+        if not ids:
+            logger.warning(
+                "Could not extract file_id from key=%s; skipping this record.", key
             )
-            raise
+            return False
+
+        file_id, scan_timestamp = ids
+        update_scan_record_to_clean(table_name, file_id, scan_timestamp, now_iso)
+        return True
+
+    except (BotoCoreError, ClientError):
+        # Already logged (without a traceback) where the call failed; throttling
+        # and 5xx are expected under load and the traceback adds nothing.
+        return False
+    except Exception:
+        logger.exception("Error processing record: %s", record)
+        return False
 
 
 # ----------------------------------------------------------------------
@@ -143,43 +287,49 @@ def update_scan_record_to_clean(table, file_id: str):
 # ----------------------------------------------------------------------
 
 def lambda_handler(event, context):
-    logger.info("Received event: %s", json.dumps(event))
+    if logger.isEnabledFor(logging.INFO):
+        records = event.get("Records", [])
+        first_key = records[0].get("s3", {}).get("object", {}).get("key") if records else None
+        logger.info("Received event with %d record(s), first key=%s", len(records), first_key)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Full event: %s", json.dumps(event))
 
     if "Records" not in event:
         logger.warning("No Records key in event; nothing to do.")
         return {"status": "ignored", "reason": "no Records in event"}
 
-    table = get_scan_table()
-    processed = 0
-    errors = 0
+    table_name = get_scan_table_name()
 
+    # S3 notifications are at-least-once: drop identical (bucket, key, eTag)
+    # records so a duplicated delivery in one batch costs a single update.
+    # Records without a bucket/key are passed through so each is counted
+    # as an error by process_record.
+    records = []
+    seen = set()
     for record in event["Records"]:
-        try:
-            s3_info = record.get("s3", {})
-            bucket = s3_info.get("bucket", {}).get("name")
-            key = s3_info.get("object", {}).get("key")
-
-            if not bucket or not key:
-                logger.warning("Missing bucket/key in S3 event record: %s", record)
-                errors += 1
+        s3_info = record.get("s3", {})
+        s3_object = s3_info.get("object", {})
+        bucket = s3_info.get("bucket", {}).get("name")
+        key = s3_object.get("key")
+        if bucket and key:
+            tag = (bucket, key, s3_object.get("eTag"))
+            if tag in seen:
                 continue
+            seen.add(tag)
+        records.append(record)
 
-            logger.info("Processing S3 object: bucket=%s key=%s", bucket, key)
-
-            file_id = extract_file_id_from_key(key)
-            if not file_id:
-                logger.warning(
-                    "Could not extract file_id from key=%s; skipping this record.", key
-                )
-                errors += 1
-                continue
+    # One timestamp for the whole batch: records in an invocation are
+    # processed within milliseconds of each other.
+    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
 
-            update_scan_record_to_clean(table, file_id)
-            processed += 1
+    # Records are independent and I/O-bound (DynamoDB round-trips), so overlap
+    # them instead of paying each record's latency back to back.
+    outcomes = list(record_pool.map(
+        lambda record: process_record(table_name, record, now_iso), records
+    ))
 
-        except Exception:
-            errors += 1
-            logger.exception("Error processing record: %s", record)
+    processed = sum(1 for ok in outcomes if ok)
+    errors = len(outcomes) - processed
 
     result = {"status": "ok", "processed": processed, "errors": errors}
     logger.info("Lambda stub scan result: %s", result)
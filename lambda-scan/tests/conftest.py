@@ -0,0 +1,11 @@
+import os
+import sys
+
+# handler.py reads its config and builds its DynamoDB client at import time
+os.environ.setdefault("AWS_DEFAULT_REGION", "ca-central-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ["SCAN_TABLE"] = "scan-table"
+os.environ["PREWARM_CONNECTIONS"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,171 @@
+import pytest
+from botocore.stub import ANY, Stubber
+
+import handler
+
+FILE_ID = "3f2b6c1e-0d8a-4c55-9a57-1c2e4b7d9f10"
+SCAN_TIMESTAMP = "2026-10-15T11:37:18Z"
+# As delivered in S3 event notifications: ":" -> "%3A", " " -> "+"
+NEW_KEY = f"uploads/{FILE_ID}/2026-10-15T11%3A37%3A18Z/my+report.pdf"
+LEGACY_KEY = f"uploads/{FILE_ID}/report.pdf"
+
+
+def s3_record(key, etag="etag-1"):
+    return {
+        "s3": {
+            "bucket": {"name": "uploads-bucket"},
+            "object": {"key": key, "size": 10, "eTag": etag},
+        }
+    }
+
+
+def update_params(scan_timestamp):
+    return {
+        "TableName": "scan-table",
+        "Key": {
+            "file_id": {"S": FILE_ID},
+            "scan_timestamp": {"S": scan_timestamp},
+        },
+        "UpdateExpression": handler.CLEAN_UPDATE_EXPRESSION,
+        "ConditionExpression": handler.CLEAN_UPDATE_CONDITION,
+        "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+        "ExpressionAttributeValues": ANY,
+    }
+
+
+@pytest.fixture
+def ddb():
+    with Stubber(handler.dynamodb) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+# ----------------------------------------------------------------------
+# S3 key parsing
+# ----------------------------------------------------------------------
+
+def test_extract_ids_from_new_format_key():
+    key = f"uploads/{FILE_ID}/{SCAN_TIMESTAMP}/my report.pdf"
+    assert handler.extract_ids_from_key(key) == (FILE_ID, SCAN_TIMESTAMP)
+
+
+def test_extract_ids_from_legacy_key():
+    assert handler.extract_ids_from_key(LEGACY_KEY) == (FILE_ID, None)
+
+
+def test_extract_ids_rejects_unexpected_key():
+    assert handler.extract_ids_from_key("other/file.txt") is None
+
+
+# ----------------------------------------------------------------------
+# Record processing
+# ----------------------------------------------------------------------
+
+def test_new_format_key_is_url_decoded_and_updated_directly(ddb):
+    ddb.add_response("update_item", {}, update_params(SCAN_TIMESTAMP))
+
+    result = handler.lambda_handler({"Records": [s3_record(NEW_KEY)]}, None)
+
+    assert result == {"status": "ok", "processed": 1, "errors": 0}
+
+
+def test_legacy_key_looks_up_latest_record(ddb):
+    ddb.add_response(
+        "query",
+        {"Items": [{"scan_timestamp": {"S": "2025-12-01T10:00:00Z"}}]},
+        {
+            "TableName": "scan-table",
+            "KeyConditionExpression": "file_id = :f",
+            "ExpressionAttributeValues": {":f": {"S": FILE_ID}},
+            "ProjectionExpression": "scan_timestamp",
+            "ScanIndexForward": False,
+            "Limit": 1,
+        },
+    )
+    ddb.add_response("update_item", {}, update_params("2025-12-01T10:00:00Z"))
+
+    result = handler.lambda_handler({"Records": [s3_record(LEGACY_KEY)]}, None)
+
+    assert result == {"status": "ok", "processed": 1, "errors": 0}
+
+
+def test_already_clean_record_is_left_alone(ddb):
+    ddb.add_client_error(
+        "update_item",
+        "ConditionalCheckFailedException",
+        modeled_fields={"Item": {"scan_status": {"S": "CLEAN"}}},
+        expected_params=update_params(SCAN_TIMESTAMP),
+    )
+
+    result = handler.lambda_handler({"Records": [s3_record(NEW_KEY)]}, None)
+
+    assert result == {"status": "ok", "processed": 1, "errors": 0}
+
+
+def created_record_params(scan_timestamp, now_iso):
+    return {
+        "TableName": "scan-table",
+        "Item": {
+            "file_id": {"S": FILE_ID},
+            "scan_timestamp": {"S": scan_timestamp},
+            "file_name": {"S": FILE_ID},
+            "s3_bucket": {"S": "unknown"},
+            "s3_key": {"S": "unknown"},
+            "scan_status": {"S": "CLEAN"},
+            "scan_detail": {"S": "Stub scanner created CLEAN record (no AV engine)."},
+            "scan_events": {
+                "L": [
+                    {
+                        "M": {
+                            "timestamp": {"S": now_iso},
+                            "message": {"S": "Lambda stub scanner created this record."},
+                        }
+                    }
+                ]
+            },
+        },
+    }
+
+
+def test_missing_record_is_created_at_the_upload_sort_key(ddb):
+    now_iso = "2026-10-15T11:37:19Z"
+    ddb.add_client_error(
+        "update_item",
+        "ConditionalCheckFailedException",
+        expected_params=update_params(SCAN_TIMESTAMP),
+    )
+    ddb.add_response("put_item", {}, created_record_params(SCAN_TIMESTAMP, now_iso))
+
+    handler.update_scan_record_to_clean("scan-table", FILE_ID, SCAN_TIMESTAMP, now_iso)
+
+
+def test_missing_legacy_record_is_created_at_now(ddb, monkeypatch):
+    monkeypatch.setattr(handler, "LOOKUP_RETRY_SECONDS", 0)
+    now_iso = "2026-10-15T11:37:19Z"
+    ddb.add_response("query", {"Items": []})
+    ddb.add_response("query", {"Items": []})
+    ddb.add_response("put_item", {}, created_record_params(now_iso, now_iso))
+
+    handler.update_scan_record_to_clean("scan-table", FILE_ID, None, now_iso)
+
+
+def test_duplicate_records_are_processed_once(ddb):
+    ddb.add_response("update_item", {}, update_params(SCAN_TIMESTAMP))
+
+    result = handler.lambda_handler(
+        {"Records": [s3_record(NEW_KEY), s3_record(NEW_KEY)]}, None
+    )
+
+    assert result == {"status": "ok", "processed": 1, "errors": 0}
+
+
+def test_unexpected_key_counts_as_error(ddb):
+    result = handler.lambda_handler({"Records": [s3_record("other/file.txt")]}, None)
+
+    assert result == {"status": "ok", "processed": 0, "errors": 1}
+
+
+def test_malformed_records_are_each_counted_as_errors(ddb):
+    result = handler.lambda_handler({"Records": [{}, {"s3": {}}]}, None)
+
+    assert result == {"status": "ok", "processed": 0, "errors": 2}